@@ -1,18 +1,15 @@
 import os
-import json
 import re
 import logging
 import asyncio
-from typing import Dict, Any
-from time import sleep
+from functools import lru_cache
+from typing import Dict, Any, Optional
+import httpx
+import orjson
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 from src.models import GraphState, InsightOutput, TraitOutput, Trait
 
-class AsyncChatOpenAI(ChatOpenAI):
-    async def ainvoke(self, *args, **kwargs):
-        return self.invoke(*args, **kwargs)
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,9 +17,122 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns for JSON extraction, so each response doesn't pay
+# for re's cache lookup and argument parsing
+_JSON_MD_BLOCK = re.compile(r'```json\s*(\{.*?\})\s*```', re.DOTALL)
+_JSON_CODE_BLOCK = re.compile(r'```\s*(\{.*?\})\s*```', re.DOTALL)
+_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+
+# System prompts are static, so each is wrapped in a single SystemMessage at
+# import time and shared across requests; only the HumanMessage varies per
+# call. A byte-identical prefix also makes OpenAI prompt caching possible.
+INSIGHT_SYSTEM_PROMPT = """You are an expert at analyzing user responses and extracting insights.
+Your job is to:
+1. Create a short, friendly natural-language summary (1-2 sentences)
+2. Extract 2-3 key phrases that capture the essence of the response
+
+CRITICAL: Return ONLY valid JSON, no markdown, no extra text.
+
+Return your response as JSON with this structure:
+{
+    "summary": "your summary here",
+    "keywords": ["keyword1", "keyword2", "keyword3"]
+}"""
+
+TRAIT_SYSTEM_PROMPT = """You are an expert psychologist analyzing user responses for personality traits.
+Your job is to:
+1. Identify 2-3 relevant personality or behavioral traits from the user's answer
+2. Score each trait from -1 to 1 (where -1 is low/negative, 0 is neutral, 1 is high/positive)
+3. Provide a one-sentence reason for each score
+
+Common traits to consider:
+- relationship_goal_readiness: How ready they are for their stated relationship goal
+- openness_to_commitment: Willingness to commit to a relationship
+- social_energy: Preference for social vs solitary activities
+- emotional_awareness: Understanding of their own emotions and needs
+
+CRITICAL: Return ONLY valid JSON, no markdown, no extra text.
+
+Return your response as JSON with this structure:
+{
+    "traits": [
+        {
+            "name": "trait_name",
+            "score": 0.8,
+            "reason": "One sentence explaining the score"
+        }
+    ]
+}"""
+
+_INSIGHT_SYSTEM_MESSAGE = SystemMessage(content=INSIGHT_SYSTEM_PROMPT)
+_TRAIT_SYSTEM_MESSAGE = SystemMessage(content=TRAIT_SYSTEM_PROMPT)
+
+
+def insight_user_prompt(question: str, answer: str) -> str:
+    """Build the per-request user prompt for the InsightAgent"""
+    return f"""Question: {question}
+
+Answer: {answer}
+
+Analyze this Q&A pair and provide a summary and keywords."""
+
+
+def trait_user_prompt(question: str, answer: str) -> str:
+    """Build the per-request user prompt for the TraitAgent"""
+    return f"""Question: {question}
+
+Answer: {answer}
+
+Analyze this Q&A pair and provide 2-3 trait scores with reasoning."""
+
 
-# Initialize OpenAI client 
-def get_llm():
+# Per-agent prompt cache keys: versioned so a prompt edit can bust the
+# server-side cache explicitly, and distinct per agent so OpenAI routes
+# each request to the shard holding that agent's cached prefix
+INSIGHT_PROMPT_CACHE_KEY = "onboarding-insight-v1"
+TRAIT_PROMPT_CACHE_KEY = "onboarding-trait-v1"
+
+# Proactive client-side pacing: cap concurrent OpenAI calls so a burst of
+# requests doesn't blow straight through the account's RPM limit and set
+# off a retry storm. Every agent call acquires this before sending.
+OPENAI_SEM = asyncio.Semaphore(int(os.getenv("OPENAI_CONCURRENCY", "16")))
+
+
+# One pooled httpx client shared by every async LLM client, so all OpenAI
+# calls reuse warm keep-alive connections instead of paying a TCP+TLS
+# handshake per request. Created lazily because an AsyncClient should be
+# built once the event loop exists
+_http_async_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """Return the shared pooled HTTP client, creating it on first use"""
+    global _http_async_client
+    if _http_async_client is None:
+        _http_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=64, max_connections=256),
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+    return _http_async_client
+
+
+async def close_http_async_client() -> None:
+    """Close the shared HTTP client (app shutdown hook)"""
+    global _http_async_client
+    if _http_async_client is not None:
+        await _http_async_client.aclose()
+        _http_async_client = None
+        # The memoized LLM clients hold a reference to the closed client,
+        # so drop them too
+        get_async_llm.cache_clear()
+
+
+# Initialize OpenAI client
+# Memoized so all requests share one client per cache key (and its keep-alive
+# connection pool) instead of opening a fresh TLS connection per agent call
+@lru_cache(maxsize=4)
+def get_llm(prompt_cache_key=None):
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY environment variable not set")
@@ -31,21 +141,31 @@ def get_llm():
         temperature=0.7,
         api_key=api_key,
         request_timeout=30,  # 30 second timeout
-        max_retries=2  # Built-in retry
+        max_retries=3,  # SDK-level retry with jittered exponential backoff
+        # Guarantees a parseable JSON body, so no markdown fences or stray
+        # text to strip and no retries spent on malformed responses
+        model_kwargs={"response_format": {"type": "json_object"}},
+        extra_body={"prompt_cache_key": prompt_cache_key} if prompt_cache_key else None
     )
 
 
 # Initialize Async OpenAI client
-def get_async_llm():
+# ChatOpenAI.ainvoke is natively async (httpx.AsyncClient under the hood),
+# so both agents' HTTP calls can overlap without blocking the event loop
+@lru_cache(maxsize=4)
+def get_async_llm(prompt_cache_key=None):
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY environment variable not set")
-    return AsyncChatOpenAI(
+    return ChatOpenAI(
         model="gpt-4o-mini",
         temperature=0.7,
         api_key=api_key,
         request_timeout=30,
-        max_retries=2
+        max_retries=3,
+        model_kwargs={"response_format": {"type": "json_object"}},
+        extra_body={"prompt_cache_key": prompt_cache_key} if prompt_cache_key else None,
+        http_async_client=get_http_async_client()
     )
 
 
@@ -54,85 +174,191 @@ def extract_json_from_response(text: str) -> dict:
     Robustly extract JSON from LLM response.
     Handles cases where LLM wraps JSON in markdown or adds extra text.
     """
-    # Try direct JSON parse first
+    # Try direct JSON parse first (orjson is several times faster than stdlib json)
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
         logger.warning("Direct JSON parse failed, attempting extraction")
     
     # Try extracting from markdown code blocks
-    json_match = re.search(r'```json\s*(\{.*?\})\s*```', text, re.DOTALL)
+    json_match = _JSON_MD_BLOCK.search(text)
     if json_match:
         try:
-            return json.loads(json_match.group(1))
-        except json.JSONDecodeError:
+            return orjson.loads(json_match.group(1))
+        except orjson.JSONDecodeError:
             pass
-    
+
     # Try extracting from generic code blocks
-    json_match = re.search(r'```\s*(\{.*?\})\s*```', text, re.DOTALL)
+    json_match = _JSON_CODE_BLOCK.search(text)
     if json_match:
         try:
-            return json.loads(json_match.group(1))
-        except json.JSONDecodeError:
+            return orjson.loads(json_match.group(1))
+        except orjson.JSONDecodeError:
             pass
-    
+
     # Try finding first JSON object in text
-    json_match = re.search(r'\{.*\}', text, re.DOTALL)
+    json_match = _JSON_OBJECT.search(text)
     if json_match:
         try:
-            return json.loads(json_match.group(0))
-        except json.JSONDecodeError:
+            return orjson.loads(json_match.group(0))
+        except orjson.JSONDecodeError:
             pass
     
     raise ValueError(f"Could not extract valid JSON from response: {text[:200]}...")
 
 
-def call_llm_with_retry(llm, messages, max_attempts=3, agent_name="agent"):
-    """
-    Call LLM with exponential backoff retry logic (synchronous).
-    """
-    for attempt in range(max_attempts):
-        try:
-            logger.info(f"{agent_name}: Attempt {attempt + 1}/{max_attempts}")
-            response = llm.invoke(messages)
-            logger.info(f"{agent_name}: Successfully received response")
-            return response
-        
-        except Exception as e:
-            logger.error(f"{agent_name}: Attempt {attempt + 1} failed: {str(e)}")
-            
-            if attempt < max_attempts - 1:
-                # Exponential backoff: 1s, 2s, 4s
-                wait_time = 2 ** attempt
-                logger.info(f"{agent_name}: Retrying in {wait_time}s...")
-                sleep(wait_time)
-            else:
-                logger.error(f"{agent_name}: All retry attempts exhausted")
-                raise
+# ============================================================================
+# MICRO-BATCHING
+# ============================================================================
+
+# Instruction prepended when several calls are combined into one request
+_BATCH_HEADER = """You will receive multiple independent inputs, numbered starting at 1.
+Process each input separately, following your instructions above for each one.
 
+CRITICAL: Return ONLY a valid JSON object of this form, no markdown, no extra text:
+{"results": [<result for input 1>, <result for input 2>, ...]}
+The results array must contain exactly one entry per input, in the same order."""
 
-async def call_llm_with_retry_async(llm, messages, max_attempts=3, agent_name="agent"):
+
+class AgentBatcher:
     """
-    Call LLM with exponential backoff retry logic (asynchronous).
+    Micro-batches concurrent calls to one agent type into a single LLM request.
+
+    All calls to a given agent share the same system prompt and differ only in
+    the user message, so calls arriving within a short window are combined
+    into one numbered prompt and the model is asked for a results array. This
+    divides the OpenAI requests consumed under concurrent load by the batch
+    size; a lone request still goes out as a normal single call after at most
+    max_wait_ms. If a combined response can't be split back cleanly, the
+    batch falls back to individual calls so no request is lost.
     """
-    for attempt in range(max_attempts):
-        try:
-            logger.info(f"{agent_name}: Async attempt {attempt + 1}/{max_attempts}")
+
+    def __init__(self, agent_name: str, system_message: SystemMessage,
+                 prompt_cache_key: str, max_batch: int = None, max_wait_ms: float = None):
+        self.agent_name = agent_name
+        self.system_message = system_message
+        self.prompt_cache_key = prompt_cache_key
+        self.max_batch = max_batch if max_batch is not None else int(os.getenv("OPENAI_BATCH_MAX", "16"))
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else float(os.getenv("OPENAI_BATCH_WAIT_MS", "25"))
+        # Pending (user_prompt, future) pairs waiting for the next flush;
+        # only touched from the event loop, so no lock is needed
+        self._pending = []
+        self._flush_handle = None
+
+    async def submit(self, user_prompt: str) -> dict:
+        """Queue one call and return its parsed JSON result"""
+        # Batching disabled: plain single call
+        if self.max_batch <= 1:
+            return await self._call_single(user_prompt)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((user_prompt, future))
+
+        if len(self._pending) >= self.max_batch:
+            # Batch is full, flush immediately
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            loop.create_task(self._flush())
+        elif self._flush_handle is None:
+            # First entry in a new batch: flush after the collection window
+            self._flush_handle = loop.call_later(
+                self.max_wait_ms / 1000.0,
+                lambda: loop.create_task(self._flush())
+            )
+
+        return await future
+
+    async def _call_model(self, messages) -> str:
+        """Send one request to the model and return the raw response text"""
+        llm = get_async_llm(self.prompt_cache_key)
+        async with OPENAI_SEM:
             response = await llm.ainvoke(messages)
-            logger.info(f"{agent_name}: Successfully received async response")
-            return response
-        
+        return response.content
+
+    async def _call_single(self, user_prompt: str) -> dict:
+        """Plain un-batched call for a single prompt"""
+        content = await self._call_model([
+            self.system_message,
+            HumanMessage(content=user_prompt)
+        ])
+        return extract_json_from_response(content)
+
+    async def _call_batched(self, user_prompts) -> list:
+        """Combine several prompts into one request and split the results"""
+        numbered = "\n\n".join(
+            f"### Input {i + 1}\n{prompt}" for i, prompt in enumerate(user_prompts)
+        )
+        content = await self._call_model([
+            self.system_message,
+            HumanMessage(content=f"{_BATCH_HEADER}\n\n{numbered}")
+        ])
+        parsed = extract_json_from_response(content)
+        results = parsed.get("results")
+        if not isinstance(results, list):
+            raise ValueError(f"Batched response missing 'results' array: {str(parsed)[:200]}")
+        return results
+
+    async def _flush(self):
+        """Send everything collected so far as one batched request"""
+        self._flush_handle = None
+        batch = self._pending
+        self._pending = []
+        if not batch:
+            return
+
+        # A caller may have been cancelled while queued (e.g. client
+        # disconnect), which marks its future done; setting a result on it
+        # would raise InvalidStateError and strand the rest of the batch,
+        # so every resolution below is guarded with future.done()
+        if len(batch) == 1:
+            user_prompt, future = batch[0]
+            try:
+                result = await self._call_single(user_prompt)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            return
+
+        logger.info(f"{self.agent_name}: Sending batch of {len(batch)} calls as one request")
+        results = None
+        try:
+            results = await self._call_batched([prompt for prompt, _ in batch])
+            if len(results) != len(batch):
+                logger.warning(
+                    f"{self.agent_name}: Batch returned {len(results)} results "
+                    f"for {len(batch)} inputs, falling back to single calls"
+                )
+                results = None
         except Exception as e:
-            logger.error(f"{agent_name}: Async attempt {attempt + 1} failed: {str(e)}")
-            
-            if attempt < max_attempts - 1:
-                # Exponential backoff: 1s, 2s, 4s
-                wait_time = 2 ** attempt
-                logger.info(f"{agent_name}: Retrying in {wait_time}s...")
-                await asyncio.sleep(wait_time)
+            logger.warning(f"{self.agent_name}: Batched call failed ({e}), falling back to single calls")
+
+        if results is not None:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            return
+
+        # Fallback: run the batch as concurrent individual calls
+        async def run_one(user_prompt, future):
+            try:
+                result = await self._call_single(user_prompt)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
             else:
-                logger.error(f"{agent_name}: All async retry attempts exhausted")
-                raise
+                if not future.done():
+                    future.set_result(result)
+
+        await asyncio.gather(*(run_one(prompt, future) for prompt, future in batch))
+
+
+_INSIGHT_BATCHER = AgentBatcher("InsightAgent", _INSIGHT_SYSTEM_MESSAGE, INSIGHT_PROMPT_CACHE_KEY)
+_TRAIT_BATCHER = AgentBatcher("TraitAgent", _TRAIT_SYSTEM_MESSAGE, TRAIT_PROMPT_CACHE_KEY)
 
 
 def insight_agent(state: GraphState) -> dict:
@@ -142,34 +368,18 @@ def insight_agent(state: GraphState) -> dict:
     logger.info(f"InsightAgent: Processing for user {state.user_id}")
     
     try:
-        llm = get_llm()
+        llm = get_llm(INSIGHT_PROMPT_CACHE_KEY)
         
-        system_prompt = """You are an expert at analyzing user responses and extracting insights.
-Your job is to:
-1. Create a short, friendly natural-language summary (1-2 sentences)
-2. Extract 2-3 key phrases that capture the essence of the response
-
-CRITICAL: Return ONLY valid JSON, no markdown, no extra text.
-
-Return your response as JSON with this structure:
-{
-    "summary": "your summary here",
-    "keywords": ["keyword1", "keyword2", "keyword3"]
-}"""
-
-        user_prompt = f"""Question: {state.question}
-
-Answer: {state.answer}
-
-Analyze this Q&A pair and provide a summary and keywords."""
+        user_prompt = insight_user_prompt(state.question, state.answer)
 
         messages = [
-            SystemMessage(content=system_prompt),
+            _INSIGHT_SYSTEM_MESSAGE,
             HumanMessage(content=user_prompt)
         ]
         
-        # Call LLM with retry logic
-        response = call_llm_with_retry(llm, messages, agent_name="InsightAgent")
+        # The client's built-in retry handles transient failures with
+        # jittered exponential backoff honoring Retry-After
+        response = llm.invoke(messages)
         
         # Robust JSON extraction
         result = extract_json_from_response(response.content)
@@ -192,46 +402,16 @@ def trait_agent(state: GraphState) -> dict:
     logger.info(f"TraitAgent: Processing for user {state.user_id}")
     
     try:
-        llm = get_llm()
+        llm = get_llm(TRAIT_PROMPT_CACHE_KEY)
         
-        system_prompt = """You are an expert psychologist analyzing user responses for personality traits.
-Your job is to:
-1. Identify 2-3 relevant personality or behavioral traits from the user's answer
-2. Score each trait from -1 to 1 (where -1 is low/negative, 0 is neutral, 1 is high/positive)
-3. Provide a one-sentence reason for each score
-
-Common traits to consider:
-- relationship_goal_readiness: How ready they are for their stated relationship goal
-- openness_to_commitment: Willingness to commit to a relationship
-- social_energy: Preference for social vs solitary activities
-- emotional_awareness: Understanding of their own emotions and needs
-
-CRITICAL: Return ONLY valid JSON, no markdown, no extra text.
-
-Return your response as JSON with this structure:
-{
-    "traits": [
-        {
-            "name": "trait_name",
-            "score": 0.8,
-            "reason": "One sentence explaining the score"
-        }
-    ]
-}"""
-
-        user_prompt = f"""Question: {state.question}
-
-Answer: {state.answer}
-
-Analyze this Q&A pair and provide 2-3 trait scores with reasoning."""
+        user_prompt = trait_user_prompt(state.question, state.answer)
 
         messages = [
-            SystemMessage(content=system_prompt),
+            _TRAIT_SYSTEM_MESSAGE,
             HumanMessage(content=user_prompt)
         ]
         
-        # Call LLM with retry logic
-        response = call_llm_with_retry(llm, messages, agent_name="TraitAgent")
+        response = llm.invoke(messages)
         
         # Robust JSON extraction
         result = extract_json_from_response(response.content)
@@ -258,38 +438,12 @@ async def insight_agent_async(state: GraphState) -> dict:
     logger.info(f"InsightAgent (Async): Processing for user {state.user_id}")
     
     try:
-        llm = get_async_llm()
-        
-        system_prompt = """You are an expert at analyzing user responses and extracting insights.
-Your job is to:
-1. Create a short, friendly natural-language summary (1-2 sentences)
-2. Extract 2-3 key phrases that capture the essence of the response
-
-CRITICAL: Return ONLY valid JSON, no markdown, no extra text.
-
-Return your response as JSON with this structure:
-{
-    "summary": "your summary here",
-    "keywords": ["keyword1", "keyword2", "keyword3"]
-}"""
-
-        user_prompt = f"""Question: {state.question}
-
-Answer: {state.answer}
+        user_prompt = insight_user_prompt(state.question, state.answer)
 
-Analyze this Q&A pair and provide a summary and keywords."""
+        # Submit through the batcher: concurrent insight calls within the
+        # collection window share a single LLM request
+        result = await _INSIGHT_BATCHER.submit(user_prompt)
 
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        
-        # Call LLM with async retry logic
-        response = await call_llm_with_retry_async(llm, messages, agent_name="InsightAgent")
-        
-        # Robust JSON extraction
-        result = extract_json_from_response(response.content)
-        
         # Validate with Pydantic
         insight = InsightOutput(**result)
         
@@ -308,50 +462,12 @@ async def trait_agent_async(state: GraphState) -> dict:
     logger.info(f"TraitAgent (Async): Processing for user {state.user_id}")
     
     try:
-        llm = get_async_llm()
-        
-        system_prompt = """You are an expert psychologist analyzing user responses for personality traits.
-Your job is to:
-1. Identify 2-3 relevant personality or behavioral traits from the user's answer
-2. Score each trait from -1 to 1 (where -1 is low/negative, 0 is neutral, 1 is high/positive)
-3. Provide a one-sentence reason for each score
-
-Common traits to consider:
-- relationship_goal_readiness: How ready they are for their stated relationship goal
-- openness_to_commitment: Willingness to commit to a relationship
-- social_energy: Preference for social vs solitary activities
-- emotional_awareness: Understanding of their own emotions and needs
-
-CRITICAL: Return ONLY valid JSON, no markdown, no extra text.
+        user_prompt = trait_user_prompt(state.question, state.answer)
 
-Return your response as JSON with this structure:
-{
-    "traits": [
-        {
-            "name": "trait_name",
-            "score": 0.8,
-            "reason": "One sentence explaining the score"
-        }
-    ]
-}"""
-
-        user_prompt = f"""Question: {state.question}
+        # Submit through the batcher: concurrent trait calls within the
+        # collection window share a single LLM request
+        result = await _TRAIT_BATCHER.submit(user_prompt)
 
-Answer: {state.answer}
-
-Analyze this Q&A pair and provide 2-3 trait scores with reasoning."""
-
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        
-        # Call LLM with async retry logic
-        response = await call_llm_with_retry_async(llm, messages, agent_name="TraitAgent")
-        
-        # Robust JSON extraction
-        result = extract_json_from_response(response.content)
-        
         # Validate with Pydantic
         trait_output = TraitOutput(**result)
         
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List
+
+import orjson
+from openai import AsyncOpenAI
+
+from src.models import OnboardingInput, OnboardingResponse, InsightOutput, TraitOutput
+from src.agents import (
+    INSIGHT_SYSTEM_PROMPT,
+    TRAIT_SYSTEM_PROMPT,
+    insight_user_prompt,
+    trait_user_prompt,
+    extract_json_from_response,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_MODEL = "gpt-4o-mini"
+# OpenAI bills Batch API requests at 50% of the synchronous price
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_SECONDS = float(os.getenv("OPENAI_BATCH_POLL_SECONDS", "30"))
+BATCH_TIMEOUT_SECONDS = float(os.getenv("OPENAI_BATCH_TIMEOUT_SECONDS", str(24 * 3600)))
+
+_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def _request_line(custom_id: str, system_prompt: str, user_prompt: str) -> dict:
+    """Build one /v1/chat/completions request line for the batch JSONL file"""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": BATCH_MODEL,
+            "temperature": 0.7,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+        },
+    }
+
+
+def build_batch_payload(inputs: List[OnboardingInput]) -> bytes:
+    """
+    Serialize the JSONL payload for a batch: two request lines per input
+    (one per agent), tagged with the input index so results can be matched
+    back regardless of completion order.
+    """
+    lines = []
+    for i, input_data in enumerate(inputs):
+        lines.append(_request_line(
+            f"{i}:insight",
+            INSIGHT_SYSTEM_PROMPT,
+            insight_user_prompt(input_data.question, input_data.answer)
+        ))
+        lines.append(_request_line(
+            f"{i}:trait",
+            TRAIT_SYSTEM_PROMPT,
+            trait_user_prompt(input_data.question, input_data.answer)
+        ))
+    return b"\n".join(orjson.dumps(line) for line in lines)
+
+
+def parse_batch_output(
+    output_text: str,
+    inputs: List[OnboardingInput]
+) -> List[OnboardingResponse]:
+    """Match the result JSONL back to inputs by custom_id and validate"""
+    results = {}
+    for line in output_text.splitlines():
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        custom_id = record["custom_id"]
+        error = record.get("error")
+        if error:
+            raise ValueError(f"Batch request {custom_id} failed: {error}")
+        content = record["response"]["body"]["choices"][0]["message"]["content"]
+        results[custom_id] = extract_json_from_response(content)
+
+    responses = []
+    for i, input_data in enumerate(inputs):
+        insight_result = results.get(f"{i}:insight")
+        trait_result = results.get(f"{i}:trait")
+        if insight_result is None:
+            raise ValueError(f"Batch output missing insight result for input {i}")
+        if trait_result is None:
+            raise ValueError(f"Batch output missing trait result for input {i}")
+        responses.append(OnboardingResponse(
+            user_id=input_data.user_id,
+            insight=InsightOutput(**insight_result),
+            traits=TraitOutput(**trait_result).traits
+        ))
+    return responses
+
+
+async def process_onboarding_batch(
+    inputs: List[OnboardingInput]
+) -> List[OnboardingResponse]:
+    """
+    Process many onboarding Q&As through OpenAI's Batch API.
+
+    For non-latency-critical workloads (e.g. re-analyzing historical
+    onboarding responses) this costs half as much as the realtime path:
+    the requests are uploaded as a JSONL file, run inside OpenAI's
+    completion window, and polled until done. Expect minutes to hours of
+    wall-clock time, not seconds.
+
+    Raises:
+        TimeoutError: If the batch doesn't finish within BATCH_TIMEOUT_SECONDS
+        RuntimeError: If the batch finishes in a non-completed state
+    """
+    logger.info(f"Submitting batch of {len(inputs)} inputs ({2 * len(inputs)} requests)")
+
+    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    batch_file = await client.files.create(
+        file=("onboarding_batch.jsonl", build_batch_payload(inputs)),
+        purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window=BATCH_COMPLETION_WINDOW
+    )
+    logger.info(f"Batch {batch.id} created with status {batch.status}")
+
+    deadline = time.time() + BATCH_TIMEOUT_SECONDS
+    while batch.status not in _TERMINAL_STATUSES:
+        if time.time() > deadline:
+            raise TimeoutError(f"Batch {batch.id} did not finish within {BATCH_TIMEOUT_SECONDS}s")
+        await asyncio.sleep(BATCH_POLL_SECONDS)
+        batch = await client.batches.retrieve(batch.id)
+        logger.info(f"Batch {batch.id} status: {batch.status}")
+
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} finished with status {batch.status}")
+
+    output = await client.files.content(batch.output_file_id)
+    responses = parse_batch_output(output.text, inputs)
+
+    logger.info(f"Batch {batch.id} completed with {len(responses)} results")
+    return responses
@@ -0,0 +1,393 @@
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+import orjson
+
+from src.models import OnboardingInput, OnboardingResponse
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """
+    In-memory LRU cache for analysis results with TTL expiration.
+
+    Identical (question, answer) pairs skip the LLM pipeline entirely and
+    return the previously computed OnboardingResponse.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: int = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # cache_key -> (serialized response bytes, cached_at timestamp).
+        # Entries are stored as orjson-dumped bytes rather than live Pydantic
+        # models: a fraction of the memory per entry, and hits rebuild the
+        # model via pydantic-core's Rust JSON path
+        self.cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # Guards cache mutation: get/set can interleave with other coroutines
+        # (and threads under multi-worker setups), and OrderedDict raises if
+        # mutated mid-iteration
+        self._lock = threading.Lock()
+        # Single-flight map: cache_key -> Future for a computation already
+        # in progress, so concurrent identical requests share one result
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        # Min-heap of (expiry_ts, cache_key) so expired entries can be
+        # popped from the head instead of scanning the whole cache
+        self._expiry_heap: List[tuple] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def cache_key(self, input_data: OnboardingInput) -> tuple:
+        """
+        Build a stable key from the Q&A pair (user_id is deliberately
+        excluded).
+
+        Public so the handler can compute the key once per request and pass
+        it to get/set/coalescing instead of each call rebuilding it.
+        """
+        # A plain (question, answer) tuple is all an in-process dict needs:
+        # Python's own hashing is collision-safe here, and skipping the
+        # digest+hexdigest round trip makes every cache op allocation-free
+        return (input_data.question, input_data.answer)
+
+    def get(self, input_data: OnboardingInput) -> Optional[OnboardingResponse]:
+        """Return the cached response for this Q&A pair, or None on miss"""
+        serialized = self.get_bytes_by_key(self.cache_key(input_data))
+        if serialized is None:
+            return None
+        return OnboardingResponse.model_validate_json(serialized)
+
+    def get_bytes(self, input_data: OnboardingInput) -> Optional[bytes]:
+        """Return the cached response as serialized JSON bytes, or None on miss"""
+        return self.get_bytes_by_key(self.cache_key(input_data))
+
+    def get_bytes_by_key(self, cache_key: tuple) -> Optional[bytes]:
+        """
+        Return the cached response for a precomputed key as serialized JSON
+        bytes, or None on miss.
+
+        Lets the HTTP handler send a hit straight to the socket without
+        rebuilding and re-serializing the Pydantic model.
+        """
+        with self._lock:
+            entry = self.cache.get(cache_key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            serialized, cached_at = entry
+
+            # Expire lazily on access
+            if time.time() - cached_at > self.ttl_seconds:
+                del self.cache[cache_key]
+                self.misses += 1
+                logger.debug(f"Cache entry expired for key {str(cache_key)[:48]}")
+                return None
+
+            # Refresh LRU position
+            self.cache.move_to_end(cache_key)
+            self.hits += 1
+
+        logger.info(f"Cache hit for key {str(cache_key)[:48]}")
+        return serialized
+
+    def set(self, input_data: OnboardingInput, result: OnboardingResponse) -> None:
+        """Store a freshly computed response, evicting the LRU entry if full"""
+        self.set_by_key(self.cache_key(input_data), result)
+
+    def set_by_key(self, cache_key: tuple, result: OnboardingResponse) -> None:
+        """Store a freshly computed response under a precomputed key"""
+        with self._lock:
+            now = time.time()
+            self._clean_expired_locked(now)
+
+            if cache_key not in self.cache and len(self.cache) >= self.max_size:
+                self._evict_lru()
+
+            self.cache[cache_key] = (orjson.dumps(result.model_dump(mode="json")), now)
+            self.cache.move_to_end(cache_key)
+            heapq.heappush(self._expiry_heap, (now + self.ttl_seconds, cache_key))
+        logger.debug(f"Cached result for key {str(cache_key)[:48]}")
+
+    def _evict_lru(self) -> None:
+        """Drop the least recently used entry (caller must hold the lock)"""
+        evicted_key, _ = self.cache.popitem(last=False)
+        self.evictions += 1
+        logger.debug(f"Evicted LRU cache entry {str(evicted_key)[:48]}")
+
+    async def run_coalesced(
+        self,
+        input_data: OnboardingInput,
+        compute: Callable[[], Awaitable[OnboardingResponse]]
+    ) -> OnboardingResponse:
+        """Run compute() for this Q&A pair, coalescing concurrent duplicates"""
+        return await self.run_coalesced_by_key(self.cache_key(input_data), compute)
+
+    async def run_coalesced_by_key(
+        self,
+        cache_key: tuple,
+        compute: Callable[[], Awaitable[OnboardingResponse]]
+    ) -> OnboardingResponse:
+        """
+        Run compute() for a precomputed key, coalescing concurrent duplicates.
+
+        The first caller for a given key becomes the leader and actually runs
+        compute(); any identical request arriving while it is in flight just
+        awaits the leader's Future instead of launching its own LLM pipeline.
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            future = self._inflight.get(cache_key)
+            if future is None:
+                future = loop.create_future()
+                self._inflight[cache_key] = future
+                is_leader = True
+            else:
+                self.coalesced += 1
+                is_leader = False
+
+        if not is_leader:
+            logger.info(f"Coalescing duplicate in-flight request for key {str(cache_key)[:48]}")
+            return await future
+
+        try:
+            result = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so asyncio doesn't warn when there are no waiters
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # If the leader was cancelled mid-compute (client disconnect),
+            # the except above never ran: cancel the shared future too so
+            # waiters fail fast and can retry instead of hanging forever
+            if not future.done():
+                future.cancel()
+            with self._lock:
+                self._inflight.pop(cache_key, None)
+
+    def _clean_expired(self) -> int:
+        """Remove all expired entries, returning how many were dropped"""
+        with self._lock:
+            return self._clean_expired_locked(time.time())
+
+    def _clean_expired_locked(self, now: float) -> int:
+        """
+        Pop expired entries off the head of the expiry heap (caller must
+        hold the lock).
+
+        Amortized O(log N) per expired entry instead of a full O(N) scan.
+        A re-set key leaves a stale heap entry behind, so each popped key is
+        checked against the live timestamp before being dropped.
+        """
+        cleaned = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, key = heapq.heappop(self._expiry_heap)
+            entry = self.cache.get(key)
+            if entry is not None and now - entry[1] > self.ttl_seconds:
+                del self.cache[key]
+                cleaned += 1
+        return cleaned
+
+    def get_stats(self) -> dict:
+        """
+        Return cache statistics.
+
+        Just reads counters; expired entries are evicted lazily in get(), so
+        there is no O(N) sweep on the stats path.
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self.cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "hit_rate": self.hits / total if total > 0 else 0.0
+        }
+
+    def clear(self) -> None:
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self.cache.clear()
+            self._expiry_heap.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+
+def _load_default_encoder() -> Callable[[str], np.ndarray]:
+    """
+    Load the default sentence-transformers encoder (all-MiniLM-L6-v2, 384-d).
+
+    Imported lazily so the service (and the test suite) can run without the
+    model installed; the semantic tier simply disables itself if unavailable.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+
+    def encode(text: str) -> np.ndarray:
+        return model.encode(text, normalize_embeddings=True)
+
+    return encode
+
+
+class SemanticCache:
+    """
+    Second-tier cache that matches semantically equivalent Q&A pairs.
+
+    Answers like "I love hiking" and "I enjoy hiking" miss the exact-match
+    AnalysisCache but still describe the same user intent. This tier embeds
+    question||answer with a small local model and returns the stored
+    OnboardingResponse of the nearest neighbor when cosine similarity is at
+    or above the threshold. One ~5 ms embedding plus a single matvec is far
+    cheaper than two LLM round trips.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        similarity_threshold: float = 0.90,
+        encoder: Optional[Callable[[str], np.ndarray]] = None
+    ):
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        self._encoder = encoder
+        self._encoder_failed = False
+        # Serializes the one-time encoder load so concurrent first misses
+        # don't construct the model twice
+        self._encoder_lock = asyncio.Lock()
+        # Normalized embeddings packed into one contiguous float16 matrix
+        # (preallocated on first insert, once the embedding dim is known) so
+        # every lookup is a single cache-friendly BLAS matvec; float16 halves
+        # memory and doubles effective bandwidth vs float32
+        self._embeddings: Optional[np.ndarray] = None
+        self._count = 0
+        # Responses and per-entry hit counts (for LFU eviction), parallel to
+        # the first _count rows of the embedding matrix
+        self._responses: List[OnboardingResponse] = []
+        self._hit_counts: List[int] = []
+        self.hits = 0
+        self.misses = 0
+
+    async def _embed(self, input_data: OnboardingInput) -> Optional[np.ndarray]:
+        """Embed the Q&A pair, or return None if no encoder is available"""
+        if self._encoder_failed:
+            return None
+        if self._encoder is None:
+            async with self._encoder_lock:
+                if self._encoder is None and not self._encoder_failed:
+                    try:
+                        # Model construction can take seconds (or download the
+                        # weights), so it must not run on the event loop
+                        self._encoder = await asyncio.to_thread(_load_default_encoder)
+                    except ImportError:
+                        # Degrade gracefully: exact-match caching still works
+                        logger.warning(
+                            "sentence-transformers not installed, semantic cache disabled"
+                        )
+                        self._encoder_failed = True
+            if self._encoder is None:
+                return None
+        # The encode itself is a blocking model forward pass; run it in a
+        # worker thread so in-flight requests keep making progress
+        raw = await asyncio.to_thread(
+            self._encoder, f"{input_data.question}||{input_data.answer}"
+        )
+        vec = np.asarray(raw, dtype=np.float32)
+        # Normalize so similarity is a plain dot product at query time
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec
+
+    async def get(self, input_data: OnboardingInput) -> Optional[OnboardingResponse]:
+        """Return the nearest cached response if it is similar enough"""
+        if self._count == 0:
+            self.misses += 1
+            return None
+
+        query = await self._embed(input_data)
+        if query is None:
+            self.misses += 1
+            return None
+
+        # Single matvec over the packed embedding matrix; embeddings are
+        # normalized at insert time so no division is needed here
+        similarities = self._embeddings[:self._count] @ query.astype(np.float16)
+        best = int(np.argmax(similarities))
+
+        if similarities[best] >= self.similarity_threshold:
+            self._hit_counts[best] += 1
+            self.hits += 1
+            logger.info(
+                f"Semantic cache hit (similarity={similarities[best]:.3f})"
+            )
+            return self._responses[best]
+
+        self.misses += 1
+        return None
+
+    async def set(self, input_data: OnboardingInput, result: OnboardingResponse) -> None:
+        """Store a freshly computed response, evicting the LFU entry if full"""
+        vec = await self._embed(input_data)
+        if vec is None:
+            return
+
+        if self._embeddings is None:
+            self._embeddings = np.empty((self.max_size, vec.shape[0]), dtype=np.float16)
+
+        if self._count >= self.max_size:
+            self._evict_lfu()
+
+        self._embeddings[self._count] = vec.astype(np.float16)
+        self._responses.append(result)
+        self._hit_counts.append(0)
+        self._count += 1
+
+    def _evict_lfu(self) -> None:
+        """Drop the least frequently used entry (swap-remove to stay packed)"""
+        victim = self._hit_counts.index(min(self._hit_counts))
+        last = self._count - 1
+        if victim != last:
+            self._embeddings[victim] = self._embeddings[last]
+            self._responses[victim] = self._responses[last]
+            self._hit_counts[victim] = self._hit_counts[last]
+        del self._responses[last]
+        del self._hit_counts[last]
+        self._count -= 1
+        logger.debug("Evicted LFU semantic cache entry")
+
+    def get_stats(self) -> dict:
+        """Return semantic cache statistics"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._responses),
+            "max_size": self.max_size,
+            "similarity_threshold": self.similarity_threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total > 0 else 0.0
+        }
+
+    def clear(self) -> None:
+        """Drop all entries and reset counters"""
+        self._count = 0
+        self._responses.clear()
+        self._hit_counts.clear()
+        self.hits = 0
+        self.misses = 0
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Annotated
 from langgraph.graph import StateGraph, START, END
@@ -34,6 +35,11 @@ def create_onboarding_graph():
     return workflow.compile()
 
 
+# Graph topology is static, so compile once at import time and reuse
+# the compiled workflow instead of rebuilding it on every request
+_COMPILED_GRAPH = create_onboarding_graph()
+
+
 def process_onboarding(input_data: OnboardingInput) -> OnboardingResponse:
     """
     Process an onboarding Q&A through the multi-agent graph
@@ -58,10 +64,9 @@ def process_onboarding(input_data: OnboardingInput) -> OnboardingResponse:
             answer=input_data.answer
         )
         
-        # Create and run the graph
-        logger.debug("Creating and compiling graph")
-        graph = create_onboarding_graph()
-        
+        # Reuse the graph compiled at module load
+        graph = _COMPILED_GRAPH
+
         # Run the graph with initial state
         logger.info(f"Executing parallel agents for user: {input_data.user_id}")
         final_state = graph.invoke(initial_state)
@@ -74,7 +79,9 @@ def process_onboarding(input_data: OnboardingInput) -> OnboardingResponse:
         
         # Merge results into final response
         logger.debug("Merging agent results")
-        response = OnboardingResponse(
+        # model_construct skips re-validation: the agents already validated
+        # these sub-models, so there is nothing left to check
+        response = OnboardingResponse.model_construct(
             user_id=final_state["user_id"],
             insight=final_state["insight"],
             traits=final_state["trait_output"].traits
@@ -89,39 +96,19 @@ def process_onboarding(input_data: OnboardingInput) -> OnboardingResponse:
 
 
 # ============================================================================
-# ASYNC GRAPH PROCESSING 
+# ASYNC PROCESSING 
 # ============================================================================
 
-def create_onboarding_graph_async():
-    """
-    Creates a LangGraph workflow that runs two async agents in parallel
-    """
-    logger.debug("Creating async LangGraph workflow")
-    
-    # Create the graph with GraphState as the state schema
-    workflow = StateGraph(GraphState)
-    
-    # Add async agent nodes
-    workflow.add_node("insight_agent", insight_agent_async)
-    workflow.add_node("trait_agent", trait_agent_async)
-    
-    # Add edges for parallel execution
-    workflow.add_edge(START, "insight_agent")
-    workflow.add_edge(START, "trait_agent")
-    workflow.add_edge("insight_agent", END)
-    workflow.add_edge("trait_agent", END)
-    
-    # Compile the graph
-    return workflow.compile()
-
-
 async def process_onboarding_async(input_data: OnboardingInput) -> OnboardingResponse:
     """
-    Process an onboarding Q&A through the multi-agent graph (Async version)
+    Process an onboarding Q&A through both agents in parallel (Async version)
     
-    This is faster than the sync version as LLM calls don't block the event loop.
+    The workflow is a trivial two-node fan-out/fan-in, so the async agents
+    are awaited directly with asyncio.gather instead of going through the
+    LangGraph scheduler. This is faster than the sync version as LLM calls
+    don't block the event loop.
     """
-    logger.info(f"Starting async graph processing for user: {input_data.user_id}")
+    logger.info(f"Starting async processing for user: {input_data.user_id}")
     
     try:
         # Create initial state from input
@@ -131,31 +118,34 @@ async def process_onboarding_async(input_data: OnboardingInput) -> OnboardingRes
             answer=input_data.answer
         )
         
-        # Create and run the graph
-        logger.debug("Creating and compiling async graph")
-        graph = create_onboarding_graph_async()
-        
-        # Run the graph with initial state (async invoke)
+        # Run both agents concurrently
         logger.info(f"Executing parallel async agents for user: {input_data.user_id}")
-        final_state = await graph.ainvoke(initial_state)
+        insight_result, trait_result = await asyncio.gather(
+            insight_agent_async(initial_state),
+            trait_agent_async(initial_state)
+        )
         
         # Validate that both agents completed
-        if final_state.get("insight") is None:
+        insight = insight_result.get("insight")
+        trait_output = trait_result.get("trait_output")
+        if insight is None:
             raise ValueError("InsightAgent failed to produce output")
-        if final_state.get("trait_output") is None:
+        if trait_output is None:
             raise ValueError("TraitAgent failed to produce output")
         
         # Merge results into final response
         logger.debug("Merging agent results")
-        response = OnboardingResponse(
-            user_id=final_state["user_id"],
-            insight=final_state["insight"],
-            traits=final_state["trait_output"].traits
+        # model_construct skips re-validation: the agents already validated
+        # these sub-models, so there is nothing left to check
+        response = OnboardingResponse.model_construct(
+            user_id=input_data.user_id,
+            insight=insight,
+            traits=trait_output.traits
         )
         
         logger.info(f"Successfully completed async processing for user: {input_data.user_id}")
         return response
         
     except Exception as e:
-        logger.error(f"Async graph processing failed for user {input_data.user_id}: {e}")
-        raise
\ No newline at end of file
+        logger.error(f"Async processing failed for user {input_data.user_id}: {e}")
+        raise
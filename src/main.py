@@ -1,13 +1,20 @@
 import os
 import logging
 import time
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from typing import List
+
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
 from dotenv import load_dotenv
 from src.models import OnboardingInput, OnboardingResponse
+from src.agents import close_http_async_client
 from src.graph import process_onboarding_async
+from src.cache import AnalysisCache, SemanticCache
+from src.batch import process_onboarding_batch
+from src.rate_limiter import RateLimiter, parse_trusted_proxies, resolve_client_ip
 
 # Configure logging
 logging.basicConfig(
@@ -16,6 +23,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# uvicorn's access log duplicates the log_requests middleware line for line
+logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+
 # Load environment variables
 load_dotenv()
 
@@ -29,32 +39,95 @@ logger.info("Starting Onboarding Multi-Agent Service")
 app = FastAPI(
     title="Onboarding Multi-Agent Service",
     description="Process onboarding Q&A through parallel LLM agents",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson serializes response bodies in C instead of pure-Python
+    # json.dumps; we already depend on it for the cache layer
+    default_response_class=ORJSONResponse
+)
+
+# Two-tier result cache: exact-match first, then semantic nearest-neighbor
+analysis_cache = AnalysisCache()
+semantic_cache = SemanticCache()
+
+# Per-IP rate limiting for the analysis endpoints
+rate_limiter = RateLimiter(
+    requests_per_minute=int(os.getenv("RATE_LIMIT_PER_MINUTE", "30")),
+    requests_per_hour=int(os.getenv("RATE_LIMIT_PER_HOUR", "500"))
 )
 
+# Proxies allowed to set X-Forwarded-For (comma-separated CIDRs, or "*").
+# When unset, the header is ignored and the TCP peer address is used
+trusted_proxies = parse_trusted_proxies(os.getenv("TRUSTED_PROXIES"))
+
+
+@app.on_event("shutdown")
+async def close_http_pool():
+    """Close the shared OpenAI connection pool on shutdown"""
+    await close_http_async_client()
+
+
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    """Enforce per-IP rate limits and attach quota headers"""
+    # Health checks are exempt so probes can't exhaust anyone's quota
+    if request.url.path == "/":
+        return await call_next(request)
+
+    peer_ip = request.client.host if request.client else "unknown"
+    client_ip = resolve_client_ip(
+        peer_ip, request.headers.get("x-forwarded-for"), trusted_proxies
+    )
+    allowed, reason, remaining_minute, remaining_hour = \
+        await rate_limiter.check_rate_limit(client_ip)
+    if not allowed:
+        logger.warning("Rate limit exceeded for %s: %s", client_ip, reason)
+        return JSONResponse(
+            status_code=429,
+            content={"detail": reason}
+        )
+
+    response = await call_next(request)
+
+    # The remaining counts come straight from the admission check, so there
+    # is no second pass over the buckets after the response
+    response.headers["X-RateLimit-Limit-Minute"] = rate_limiter.limit_minute_str
+    response.headers["X-RateLimit-Remaining-Minute"] = str(remaining_minute)
+    response.headers["X-RateLimit-Limit-Hour"] = rate_limiter.limit_hour_str
+    response.headers["X-RateLimit-Remaining-Hour"] = str(remaining_hour)
+    return response
+
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """Log all requests with timing"""
-    start_time = time.time()
-    
-    logger.info(f"Request started: {request.method} {request.url.path}")
-    
+    # Liveness probes can hit / many times a second; skip the timing and
+    # log work for them, matching the rate limit middleware's exemption
+    if request.url.path == "/":
+        return await call_next(request)
+
+    # request.url parses the URL lazily, so read method/path once up front;
+    # perf_counter is higher resolution than time() and we only need a delta
+    method = request.method
+    path = request.url.path
+    start_time = time.perf_counter()
+
+    logger.debug("Request started: %s %s", method, path)
+
     response = await call_next(request)
-    
-    process_time = time.time() - start_time
+
+    process_time = time.perf_counter() - start_time
     logger.info(
-        f"Request completed: {request.method} {request.url.path} "
-        f"Status: {response.status_code} Duration: {process_time:.2f}s"
+        "Request completed: %s %s Status: %s Duration: %.2fs",
+        method, path, response.status_code, process_time
     )
-    
+
     return response
 
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle Pydantic validation errors with detailed messages"""
-    logger.warning(f"Validation error: {exc.errors()}")
+    logger.warning("Validation error: %s", exc.errors())
     return JSONResponse(
         status_code=422,
         content={
@@ -64,6 +137,56 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
+# Error mapping for the analysis pipeline lives here rather than in a
+# try/except chain inside each handler, keeping the endpoint bodies to the
+# happy path. These fire only when an endpoint lets the exception escape.
+
+@app.exception_handler(ValidationError)
+async def agent_output_error_handler(request: Request, exc: ValidationError):
+    """Agent returned JSON that doesn't match the output models"""
+    logger.error("Agent output validation failed on %s: %s", request.url.path, exc)
+    return JSONResponse(
+        status_code=500,
+        content={"detail": "Agent produced invalid output format"}
+    )
+
+
+@app.exception_handler(ValueError)
+async def value_error_handler(request: Request, exc: ValueError):
+    """Value errors (invalid input, JSON parsing, etc.)"""
+    logger.error("Value error on %s: %s", request.url.path, exc)
+    return JSONResponse(
+        status_code=400,
+        content={"detail": f"Invalid input: {str(exc)}"}
+    )
+
+
+@app.exception_handler(TimeoutError)
+async def timeout_error_handler(request: Request, exc: TimeoutError):
+    """LLM or batch timeout"""
+    logger.error("Request timeout on %s: %s", request.url.path, exc)
+    return JSONResponse(
+        status_code=504,
+        content={"detail": "Request timed out - please try again"}
+    )
+
+
+@app.exception_handler(Exception)
+async def unexpected_error_handler(request: Request, exc: Exception):
+    """Catch-all for unexpected errors"""
+    # Formatting a traceback is expensive, so only attach it when DEBUG
+    # logging would actually emit it
+    logger.error(
+        "Unexpected error on %s: %s: %s",
+        request.url.path, type(exc).__name__, exc,
+        exc_info=logger.isEnabledFor(logging.DEBUG)
+    )
+    return JSONResponse(
+        status_code=500,
+        content={"detail": "Internal server error - please try again later"}
+    )
+
+
 @app.get("/")
 def root():
     """Health check endpoint"""
@@ -71,66 +194,131 @@ def root():
     return {"status": "healthy", "service": "onboarding-multi-agent"}
 
 
-@app.post("/analyze", response_model=OnboardingResponse)
+@app.get("/cache/stats")
+def cache_stats():
+    """Cache statistics endpoint"""
+    return {
+        "exact": analysis_cache.get_stats(),
+        "semantic": semantic_cache.get_stats()
+    }
+
+
+@app.post("/analyze", responses={200: {"model": OnboardingResponse}})
 async def analyze_onboarding(input_data: OnboardingInput):
     """
     Analyze an onboarding Q&A pair through parallel agents
-    
+
+    The response is serialized once here and sent as raw bytes: the
+    pipeline already returns a validated OnboardingResponse, so declaring
+    response_model would only make FastAPI re-validate and re-serialize it.
+    The 200 schema is kept in the OpenAPI docs via `responses`.
+
     Args:
         input_data: OnboardingInput with user_id, question, and answer
-    
+
     Returns:
         OnboardingResponse with insights and trait scores
-    
+
     Raises:
         400: Invalid input data
         500: Internal server error (LLM failure, parsing error, etc.)
     """
-    logger.info(f"Received analysis request for user: {input_data.user_id}")
-    
-    try:
-        # Process with async agents
+    logger.info("Received analysis request for user: %s", input_data.user_id)
+
+    # Errors (ValidationError, ValueError, TimeoutError, anything else) are
+    # mapped to responses by the app-level exception handlers above
+
+    # One key computation serves the cache lookup, the coalescing map
+    # and the write-back below
+    cache_key = analysis_cache.cache_key(input_data)
+
+    # Tier 1: exact-match cache. Hits are returned as the stored bytes,
+    # skipping Pydantic rehydration and re-serialization entirely
+    cached_bytes = analysis_cache.get_bytes_by_key(cache_key)
+    if cached_bytes is not None:
+        logger.info("Returning cached result for user: %s", input_data.user_id)
+        return Response(content=cached_bytes, media_type="application/json")
+
+    # Tier 2: semantic cache for near-duplicate Q&A pairs
+    cached = await semantic_cache.get(input_data)
+    if cached is not None:
+        logger.info("Returning semantic cache result for user: %s", input_data.user_id)
+        return Response(
+            content=orjson.dumps(cached.model_dump(mode="json")),
+            media_type="application/json"
+        )
+
+    # Process with async agents; identical in-flight requests are
+    # coalesced so only the first one runs the LLM pipeline
+    async def compute() -> OnboardingResponse:
         result = await process_onboarding_async(input_data)
-        
-        logger.info(f"Successfully processed request for user: {input_data.user_id}")
+        # Populate both tiers for future requests
+        analysis_cache.set_by_key(cache_key, result)
+        await semantic_cache.set(input_data, result)
         return result
-    
-    except ValidationError as e:
-        # Pydantic validation errors (from agent output validation)
-        logger.error(f"Agent output validation failed for user {input_data.user_id}: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail="Agent produced invalid output format"
-        )
-    
-    except ValueError as e:
-        # Value errors (invalid input, JSON parsing, etc.)
-        logger.error(f"Value error for user {input_data.user_id}: {e}")
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid input: {str(e)}"
-        )
-    
+
+    result = await analysis_cache.run_coalesced_by_key(cache_key, compute)
+
+    logger.info("Successfully processed request for user: %s", input_data.user_id)
+    return Response(
+        content=orjson.dumps(result.model_dump(mode="json")),
+        media_type="application/json"
+    )
+
+
+@app.post("/analyze/batch", response_model=List[OnboardingResponse])
+async def analyze_onboarding_batch(inputs: List[OnboardingInput]):
+    """
+    Analyze many onboarding Q&A pairs through OpenAI's Batch API
+
+    Intended for bulk, non-latency-critical jobs (e.g. re-analyzing
+    historical onboarding responses): half the cost of the realtime path,
+    but completion can take minutes to hours.
+
+    Args:
+        inputs: List of OnboardingInput items to analyze
+
+    Returns:
+        List of OnboardingResponse in the same order as the inputs
+
+    Raises:
+        504: Batch did not finish within the configured timeout
+        500: Batch failed or produced invalid output
+    """
+    logger.info("Received batch analysis request with %d inputs", len(inputs))
+
+    try:
+        results = await process_onboarding_batch(inputs)
+        logger.info("Batch analysis completed with %d results", len(results))
+        return results
+
     except TimeoutError as e:
-        # LLM timeout
-        logger.error(f"Request timeout for user {input_data.user_id}: {e}")
+        logger.error("Batch analysis timed out: %s", e)
         raise HTTPException(
             status_code=504,
-            detail="Request timed out - please try again"
+            detail="Batch did not complete in time - please try again"
         )
-    
+
     except Exception as e:
-        # Catch-all for unexpected errors
-        logger.error(
-            f"Unexpected error for user {input_data.user_id}: {type(e).__name__}: {e}",
-            exc_info=True
-        )
+        logger.error("Batch analysis failed: %s: %s", type(e).__name__, e, exc_info=True)
         raise HTTPException(
             status_code=500,
-            detail="Internal server error - please try again later"
+            detail="Batch analysis failed - please try again later"
         )
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop and httptools (from uvicorn[standard]) replace the default
+    # asyncio loop and pure-Python h11 parser on the request hot path.
+    # Multiple worker processes sidestep the GIL for the CPU-bound parts of
+    # request handling (middleware, validation, serialization); the app must
+    # be passed as an import string so each worker can import it itself.
+    uvicorn.run(
+        "src.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    )
\ No newline at end of file
@@ -1,48 +1,39 @@
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import List, Optional
 
 class OnboardingInput(BaseModel):
     """Input model for onboarding Q&A"""
-    user_id: str = Field(..., description="Unique user identifier")
-    question: str = Field(..., description="Onboarding question asked")
-    answer: str = Field(..., description="User's free-text answer")
-    
-    @field_validator('user_id', 'question', 'answer')
+    # Stripping and length bounds are declared on the fields so pydantic-core
+    # enforces them in Rust; the only Python-level validator left is the
+    # whitespace-only rejection, which runs once per field instead of the
+    # previous four callback round-trips
+    model_config = ConfigDict(str_strip_whitespace=True, validate_assignment=False)
+
+    user_id: str = Field(
+        ..., description="Unique user identifier", min_length=1, max_length=100
+    )
+    question: str = Field(
+        ..., description="Onboarding question asked", min_length=1, max_length=500
+    )
+    answer: str = Field(
+        ..., description="User's free-text answer", min_length=10, max_length=5000
+    )
+
+    @field_validator('user_id', 'question', 'answer', mode='before')
     @classmethod
-    def check_not_empty(cls, v: str) -> str:
+    def check_not_empty(cls, v):
         """Ensure fields are not just whitespace"""
-        if not v or not v.strip():
+        if isinstance(v, str) and not v.strip():
             raise ValueError('Field cannot be empty or just whitespace')
-        return v.strip()
-    
-    @field_validator('user_id')
-    @classmethod
-    def check_user_id_length(cls, v: str) -> str:
-        """Ensure user_id is within bounds"""
-        if len(v) < 1 or len(v) > 100:
-            raise ValueError('user_id must be between 1-100 characters')
-        return v
-    
-    @field_validator('question')
-    @classmethod
-    def check_question_length(cls, v: str) -> str:
-        """Ensure question is within bounds"""
-        if len(v) < 1 or len(v) > 500:
-            raise ValueError('question must be between 1-500 characters')
-        return v
-    
-    @field_validator('answer')
-    @classmethod
-    def check_answer_length(cls, v: str) -> str:
-        """Ensure answer has meaningful content"""
-        if len(v) < 10:
-            raise ValueError('Answer must be at least 10 characters long')
-        if len(v) > 5000:
-            raise ValueError('Answer must be less than 5000 characters')
         return v
 
 class InsightOutput(BaseModel):
     """Output from the Insight Agent"""
+    # frozen lets pydantic-core skip its mutation machinery (and makes these
+    # safe to share via the caches); extra="forbid" rejects hallucinated
+    # fields from the LLM instead of silently carrying them
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     summary: str = Field(
         ...,
         description="Natural language summary of the answer",
@@ -72,6 +63,8 @@ class InsightOutput(BaseModel):
 
 class Trait(BaseModel):
     """A single trait score with reasoning"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     name: str = Field(
         ...,
         description="Trait name",
@@ -94,6 +87,8 @@ class Trait(BaseModel):
 
 class TraitOutput(BaseModel):
     """Output from the Trait Agent"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     traits: List[Trait] = Field(
         ...,
         description="2-3 trait scores with reasoning",
@@ -126,6 +121,14 @@ class GraphState(BaseModel):
 
 class OnboardingResponse(BaseModel):
     """Final merged response"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     user_id: str
     insight: InsightOutput
-    traits: List[Trait]
\ No newline at end of file
+    traits: List[Trait]
+
+
+# Build the request-path schemas at import time so the first request doesn't
+# pay for any deferred schema construction
+OnboardingInput.model_rebuild()
+OnboardingResponse.model_rebuild()
\ No newline at end of file
@@ -0,0 +1,313 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple, Union
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    # Redis is optional: without it the limiter keeps per-process state
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Number of lock shards; must be a power of two so the shard index is a mask
+_SHARD_COUNT = 64
+
+# How often to sweep idle IPs out of the local buckets, and how long an IP
+# must be idle before it is swept. After an hour both buckets are fully
+# refilled, so dropping the entry loses no state
+_PRUNE_INTERVAL_SECONDS = 300.0
+_STALE_AFTER_SECONDS = 3600.0
+
+# Sentinel for "trust X-Forwarded-For from any peer" (TRUSTED_PROXIES="*")
+TRUST_ALL = "*"
+
+_Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_trusted_proxies(spec: Optional[str]) -> Sequence[_Network]:
+    """
+    Parse a comma-separated list of proxy CIDRs (e.g. "10.0.0.0/8,127.0.0.1").
+
+    Returns the networks whose peers are allowed to set X-Forwarded-For.
+    "*" trusts every peer; empty/unset trusts none, so the header is ignored.
+    """
+    if not spec:
+        return ()
+    if spec.strip() == TRUST_ALL:
+        return (TRUST_ALL,)
+    networks = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(part, strict=False))
+        except ValueError:
+            logger.warning("Ignoring invalid trusted proxy entry: %r", part)
+    return tuple(networks)
+
+
+def resolve_client_ip(
+    peer_ip: str,
+    forwarded_for: Optional[str],
+    trusted_proxies: Sequence[_Network]
+) -> str:
+    """
+    Determine the real client IP for rate limiting.
+
+    Behind a reverse proxy the TCP peer is the proxy, so every client would
+    share one bucket while abusers rotate proxies to reset theirs. When the
+    peer is a trusted proxy, the leftmost X-Forwarded-For entry (the
+    original client) is used instead; otherwise the header is attacker
+    controlled and the peer address wins.
+    """
+    if not forwarded_for or not trusted_proxies:
+        return peer_ip
+
+    if TRUST_ALL not in trusted_proxies:
+        try:
+            peer = ipaddress.ip_address(peer_ip)
+        except ValueError:
+            return peer_ip
+        if not any(peer in network for network in trusted_proxies):
+            return peer_ip
+
+    candidate = forwarded_for.split(",")[0].strip()
+    try:
+        ipaddress.ip_address(candidate)
+    except ValueError:
+        # Malformed header: fall back rather than keying buckets on garbage
+        return peer_ip
+    return candidate
+
+
+# Atomic token-bucket refill-and-consume for both windows. Runs server-side
+# so every replica shares one counter and there is no read-modify-write race
+# between processes. Returns {allowed, floor(minute_tokens), floor(hour_tokens)}.
+_TOKEN_BUCKET_LUA = """
+local function refill(key, capacity, rate, now)
+    local tokens = tonumber(redis.call('HGET', key, 'tokens'))
+    local ts = tonumber(redis.call('HGET', key, 'ts'))
+    if tokens == nil or ts == nil then
+        tokens = capacity
+        ts = now
+    end
+    return math.min(capacity, tokens + (now - ts) * rate)
+end
+
+local now = tonumber(ARGV[1])
+local minute_cap = tonumber(ARGV[2])
+local minute_rate = tonumber(ARGV[3])
+local hour_cap = tonumber(ARGV[4])
+local hour_rate = tonumber(ARGV[5])
+
+local minute_tokens = refill(KEYS[1], minute_cap, minute_rate, now)
+local hour_tokens = refill(KEYS[2], hour_cap, hour_rate, now)
+
+local allowed = 0
+if minute_tokens >= 1 and hour_tokens >= 1 then
+    allowed = 1
+    minute_tokens = minute_tokens - 1
+    hour_tokens = hour_tokens - 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', minute_tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 120)
+redis.call('HSET', KEYS[2], 'tokens', hour_tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[2], 7200)
+
+return {allowed, math.floor(minute_tokens), math.floor(hour_tokens)}
+"""
+
+
+class RateLimiter:
+    """
+    Per-IP rate limiter with minute and hour windows.
+
+    Uses the token-bucket algorithm: each (ip, window) pair is just two
+    floats (available tokens, last refill time), and every check refills
+    from the elapsed time and consumes one token. That makes each request
+    O(1) with no timestamp lists to scan or clean up.
+
+    When REDIS_URL is set (and the redis package is installed), bucket state
+    lives in Redis and is updated by an atomic Lua script, so multiple
+    uvicorn workers or replicas share one quota per IP instead of each
+    process granting the full budget. Without Redis, or when Redis is
+    unreachable, the limiter falls back to the local in-process buckets.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 30,
+        requests_per_hour: int = 500,
+        redis_url: Optional[str] = None,
+        max_ips: int = 100_000
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.requests_per_hour = requests_per_hour
+        # Refill rates in tokens per second
+        self._minute_rate = requests_per_minute / 60.0
+        self._hour_rate = requests_per_hour / 3600.0
+        # The limits never change at runtime, so format the X-RateLimit-Limit-*
+        # header values once instead of on every request
+        self.limit_minute_str = str(requests_per_minute)
+        self.limit_hour_str = str(requests_per_hour)
+        # ip -> (tokens, last_refill). Bounded: every unique IP ever seen
+        # would otherwise stay resident forever, which is an OOM vector under
+        # address-rotating abuse. LRU order lets the cap evict the IP that
+        # has gone longest without a request
+        self.max_ips = max_ips
+        self.minute_buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.hour_buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._last_prune = time.monotonic()
+        # Sharded locks: concurrent coroutines doing the read-modify-write on
+        # the same IP's buckets must serialize, but unrelated IPs shouldn't
+        # contend on one global lock, so each IP hashes to one of 64 shards
+        self._locks = [asyncio.Lock() for _ in range(_SHARD_COUNT)]
+
+        redis_url = redis_url or os.getenv("REDIS_URL")
+        self._redis = None
+        self._check_script = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning(
+                    "REDIS_URL is set but the redis package is not installed, "
+                    "using per-process rate limiting"
+                )
+            else:
+                # from_url doesn't connect until the first command, so this
+                # is safe even if Redis is down at startup
+                self._redis = aioredis.from_url(redis_url)
+                self._check_script = self._redis.register_script(_TOKEN_BUCKET_LUA)
+                logger.info("Rate limiter using Redis backend")
+
+    def _shard_lock(self, ip: str) -> asyncio.Lock:
+        """Pick the lock shard guarding this IP's buckets"""
+        return self._locks[hash(ip) & (_SHARD_COUNT - 1)]
+
+    def _refill(
+        self,
+        buckets: "OrderedDict[str, Tuple[float, float]]",
+        ip: str,
+        capacity: int,
+        rate: float,
+        now: float
+    ) -> float:
+        """Refill one bucket from elapsed time and return the token count"""
+        tokens, last_refill = buckets.get(ip, (float(capacity), now))
+        tokens = min(float(capacity), tokens + (now - last_refill) * rate)
+        buckets[ip] = (tokens, now)
+        buckets.move_to_end(ip)
+        # Hard cap: evict the longest-idle IP once the dict is full. An
+        # evicted-then-returning IP just starts over with a full bucket
+        if len(buckets) > self.max_ips:
+            buckets.popitem(last=False)
+        return tokens
+
+    async def check_rate_limit(self, ip: str) -> Tuple[bool, str, int, int]:
+        """
+        Check and consume one request for this IP.
+
+        Returns:
+            (allowed, reason, remaining_minute, remaining_hour) - reason is
+            empty when allowed. Returning the remaining quota here means the
+            middleware never has to make a second pass over the buckets just
+            to build the X-RateLimit-* headers.
+        """
+        if self._redis is not None:
+            try:
+                return await self._check_redis(ip)
+            except Exception as e:
+                # Degrade to per-process limiting rather than failing requests
+                logger.warning("Redis rate limit check failed (%s), using local buckets", e)
+
+        # One clock read per check, shared by both buckets. monotonic() only
+        # measures the deltas we care about and is immune to NTP wall-clock
+        # jumps, which could otherwise drain or overfill a bucket
+        now = time.monotonic()
+        if now - self._last_prune > _PRUNE_INTERVAL_SECONDS:
+            self._prune_stale(now)
+
+        async with self._shard_lock(ip):
+            minute_tokens = self._refill(
+                self.minute_buckets, ip, self.requests_per_minute, self._minute_rate, now
+            )
+            hour_tokens = self._refill(
+                self.hour_buckets, ip, self.requests_per_hour, self._hour_rate, now
+            )
+
+            if minute_tokens < 1:
+                return (
+                    False,
+                    f"Rate limit exceeded: {self.requests_per_minute} requests per minute",
+                    int(minute_tokens),
+                    int(hour_tokens)
+                )
+            if hour_tokens < 1:
+                return (
+                    False,
+                    f"Rate limit exceeded: {self.requests_per_hour} requests per hour",
+                    int(minute_tokens),
+                    int(hour_tokens)
+                )
+
+            # Both buckets have room: consume one token from each
+            self.minute_buckets[ip] = (minute_tokens - 1, self.minute_buckets[ip][1])
+            self.hour_buckets[ip] = (hour_tokens - 1, self.hour_buckets[ip][1])
+            return True, "", int(minute_tokens - 1), int(hour_tokens - 1)
+
+    def _prune_stale(self, now: float) -> None:
+        """
+        Drop IPs that have been idle past the stale window.
+
+        Runs inline at most once per prune interval rather than as a
+        background task: buckets are in LRU order, so stale entries cluster
+        at the front and the scan stops at the first live one. No awaits
+        happen mid-scan, so the event loop can't interleave a mutation.
+        """
+        self._last_prune = now
+        pruned = 0
+        for buckets in (self.minute_buckets, self.hour_buckets):
+            while buckets:
+                ip, (_, last_refill) = next(iter(buckets.items()))
+                if now - last_refill <= _STALE_AFTER_SECONDS:
+                    break
+                del buckets[ip]
+                pruned += 1
+        if pruned:
+            logger.debug("Pruned %d stale rate limit entries", pruned)
+
+    async def _check_redis(self, ip: str) -> Tuple[bool, str, int, int]:
+        """Check and consume one request against the shared Redis buckets"""
+        # Redis buckets are shared across machines, so they need a common
+        # clock: wall time, not this process's monotonic clock
+        allowed, minute_tokens, hour_tokens = await self._check_script(
+            keys=[f"rl:{ip}:minute", f"rl:{ip}:hour"],
+            args=[
+                time.time(),
+                self.requests_per_minute,
+                self._minute_rate,
+                self.requests_per_hour,
+                self._hour_rate
+            ]
+        )
+        if allowed:
+            return True, "", minute_tokens, hour_tokens
+        if minute_tokens < 1:
+            return (
+                False,
+                f"Rate limit exceeded: {self.requests_per_minute} requests per minute",
+                minute_tokens,
+                hour_tokens
+            )
+        return (
+            False,
+            f"Rate limit exceeded: {self.requests_per_hour} requests per hour",
+            minute_tokens,
+            hour_tokens
+        )
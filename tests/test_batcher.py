@@ -0,0 +1,154 @@
+"""
+Unit tests for the agent micro-batcher
+"""
+import asyncio
+import orjson
+import pytest
+from langchain_core.messages import SystemMessage
+from src.agents import AgentBatcher
+
+
+def make_batcher(responder, max_batch=4, max_wait_ms=5):
+    """Build a batcher whose model call is replaced by a local responder"""
+    batcher = AgentBatcher(
+        agent_name="TestAgent",
+        system_message=SystemMessage(content="You are a test agent."),
+        prompt_cache_key="test-v1",
+        max_batch=max_batch,
+        max_wait_ms=max_wait_ms
+    )
+
+    async def _call_model(messages):
+        return responder(messages)
+
+    batcher._call_model = _call_model
+    return batcher
+
+
+class TestAgentBatcher:
+    """Tests for AgentBatcher"""
+
+    def test_single_call_passes_through(self):
+        """Test that a lone call is sent un-batched after the wait window"""
+        calls = []
+
+        def responder(messages):
+            calls.append(messages)
+            return '{"value": 1}'
+
+        batcher = make_batcher(responder)
+        result = asyncio.run(batcher.submit("only prompt"))
+
+        assert result == {"value": 1}
+        assert len(calls) == 1
+        # Single calls carry the raw prompt, not the batch wrapper
+        assert "only prompt" in calls[0][1].content
+        assert "### Input" not in calls[0][1].content
+
+    def test_concurrent_calls_share_one_request(self):
+        """Test that concurrent calls are combined into one model request"""
+        calls = []
+
+        def responder(messages):
+            calls.append(messages)
+            count = messages[1].content.count("### Input")
+            return orjson.dumps(
+                {"results": [{"index": i} for i in range(count)]}
+            ).decode()
+
+        batcher = make_batcher(responder)
+
+        async def run():
+            return await asyncio.gather(
+                batcher.submit("prompt one"),
+                batcher.submit("prompt two"),
+                batcher.submit("prompt three")
+            )
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert results == [{"index": 0}, {"index": 1}, {"index": 2}]
+
+    def test_full_batch_flushes_immediately(self):
+        """Test that hitting max_batch flushes without waiting for the timer"""
+        calls = []
+
+        def responder(messages):
+            calls.append(messages)
+            count = messages[1].content.count("### Input")
+            return orjson.dumps({"results": [{}] * count}).decode()
+
+        # Long wait window: only an immediate flush can finish quickly
+        batcher = make_batcher(responder, max_batch=2, max_wait_ms=10_000)
+
+        async def run():
+            return await asyncio.wait_for(
+                asyncio.gather(batcher.submit("a"), batcher.submit("b")),
+                timeout=1.0
+            )
+
+        results = asyncio.run(run())
+        assert len(results) == 2
+        assert len(calls) == 1
+
+    def test_bad_batch_response_falls_back_to_single_calls(self):
+        """Test that a mismatched results array falls back to individual calls"""
+        calls = []
+
+        def responder(messages):
+            calls.append(messages)
+            if "### Input" in messages[1].content:
+                # Wrong number of results for the batch
+                return '{"results": [{"only": "one"}]}'
+            return '{"single": true}'
+
+        batcher = make_batcher(responder)
+
+        async def run():
+            return await asyncio.gather(
+                batcher.submit("prompt one"),
+                batcher.submit("prompt two")
+            )
+
+        results = asyncio.run(run())
+        # One failed batch call plus two single-call fallbacks
+        assert len(calls) == 3
+        assert results == [{"single": True}, {"single": True}]
+
+    def test_cancelled_caller_does_not_strand_batch(self):
+        """Test that one cancelled submitter doesn't hang the rest of a batch"""
+        calls = []
+
+        def responder(messages):
+            calls.append(messages)
+            count = messages[1].content.count("### Input")
+            return orjson.dumps(
+                {"results": [{"index": i} for i in range(count)]}
+            ).decode()
+
+        batcher = make_batcher(responder)
+
+        async def run():
+            doomed = asyncio.create_task(batcher.submit("prompt one"))
+            survivor = asyncio.create_task(batcher.submit("prompt two"))
+            # Let both enqueue, then cancel one before the flush fires
+            await asyncio.sleep(0)
+            doomed.cancel()
+            return await asyncio.wait_for(survivor, timeout=1.0)
+
+        result = asyncio.run(run())
+        assert result == {"index": 1}
+
+    def test_disabled_batching_calls_directly(self):
+        """Test that max_batch=1 bypasses the batching queue entirely"""
+        calls = []
+
+        def responder(messages):
+            calls.append(messages)
+            return '{"value": 2}'
+
+        batcher = make_batcher(responder, max_batch=1)
+        result = asyncio.run(batcher.submit("prompt"))
+
+        assert result == {"value": 2}
+        assert len(calls) == 1
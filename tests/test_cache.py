@@ -0,0 +1,261 @@
+"""
+Unit tests for the analysis caches
+"""
+import asyncio
+
+import numpy as np
+import pytest
+from src.cache import AnalysisCache, SemanticCache
+from src.models import OnboardingInput, OnboardingResponse, InsightOutput, Trait
+
+
+def make_input(question="What are you looking for?", answer="I want a serious relationship."):
+    """Helper to build a valid OnboardingInput"""
+    return OnboardingInput(
+        user_id="user-123",
+        question=question,
+        answer=answer
+    )
+
+
+def make_response(user_id="user-123"):
+    """Helper to build a valid OnboardingResponse"""
+    return OnboardingResponse(
+        user_id=user_id,
+        insight=InsightOutput(
+            summary="User wants a serious relationship.",
+            keywords=["serious", "relationship"]
+        ),
+        traits=[
+            Trait(name="trait1", score=0.8, reason="Reason one is here."),
+            Trait(name="trait2", score=0.5, reason="Reason two is here.")
+        ]
+    )
+
+
+class TestAnalysisCache:
+    """Tests for the exact-match AnalysisCache"""
+
+    def test_miss_then_hit(self):
+        """Test that a set entry is returned on the next get"""
+        cache = AnalysisCache()
+        input_data = make_input()
+
+        assert cache.get(input_data) is None
+        cache.set(input_data, make_response())
+        assert cache.get(input_data) is not None
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_key_ignores_user_id(self):
+        """Test that the same Q&A from different users shares one entry"""
+        cache = AnalysisCache()
+        cache.set(make_input(), make_response())
+
+        other_user = OnboardingInput(
+            user_id="user-456",
+            question="What are you looking for?",
+            answer="I want a serious relationship."
+        )
+        assert cache.get(other_user) is not None
+
+    def test_different_answer_misses(self):
+        """Test that a different answer does not hit"""
+        cache = AnalysisCache()
+        cache.set(make_input(), make_response())
+        assert cache.get(make_input(answer="I just want casual fun.")) is None
+
+    def test_ttl_expiry(self):
+        """Test that expired entries are dropped on access"""
+        cache = AnalysisCache(ttl_seconds=0)
+        cache.set(make_input(), make_response())
+        assert cache.get(make_input()) is None
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted when full"""
+        cache = AnalysisCache(max_size=2)
+        first = make_input(answer="First answer goes here.")
+        second = make_input(answer="Second answer goes here.")
+        third = make_input(answer="Third answer goes here.")
+
+        cache.set(first, make_response())
+        cache.set(second, make_response())
+        cache.get(first)  # first is now most recently used
+        cache.set(third, make_response())
+
+        assert cache.get(first) is not None
+        assert cache.get(second) is None
+        assert cache.evictions == 1
+
+    def test_get_stats(self):
+        """Test that stats report size and hit rate"""
+        cache = AnalysisCache()
+        cache.set(make_input(), make_response())
+        cache.get(make_input())
+
+        stats = cache.get_stats()
+        assert stats["size"] == 1
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == 1.0
+
+    def test_clear(self):
+        """Test that clear drops entries and resets counters"""
+        cache = AnalysisCache()
+        cache.set(make_input(), make_response())
+        cache.get(make_input())
+        cache.clear()
+
+        assert len(cache.cache) == 0
+        assert cache.hits == 0
+
+    def test_concurrent_identical_requests_coalesce(self):
+        """Test that in-flight duplicates share one compute() call"""
+        async def scenario():
+            cache = AnalysisCache()
+            input_data = make_input()
+            calls = 0
+
+            async def compute():
+                nonlocal calls
+                calls += 1
+                # Yield so the other callers arrive while this is in flight
+                await asyncio.sleep(0.01)
+                return make_response()
+
+            results = await asyncio.gather(
+                *(cache.run_coalesced(input_data, compute) for _ in range(5))
+            )
+
+            assert calls == 1
+            assert all(r.user_id == "user-123" for r in results)
+            assert cache.coalesced == 4
+            assert len(cache._inflight) == 0
+
+        asyncio.run(scenario())
+
+    def test_coalesced_requests_share_leader_failure(self):
+        """Test that waiters see the leader's exception and retry is possible"""
+        async def scenario():
+            cache = AnalysisCache()
+            input_data = make_input()
+
+            async def failing_compute():
+                await asyncio.sleep(0.01)
+                raise RuntimeError("LLM unavailable")
+
+            results = await asyncio.gather(
+                *(cache.run_coalesced(input_data, failing_compute) for _ in range(3)),
+                return_exceptions=True
+            )
+            assert all(isinstance(r, RuntimeError) for r in results)
+
+            # The failed flight is cleaned up, so a later request recomputes
+            async def ok_compute():
+                return make_response()
+
+            result = await cache.run_coalesced(input_data, ok_compute)
+            assert result.user_id == "user-123"
+
+        asyncio.run(scenario())
+
+    def test_cancelled_leader_releases_waiters(self):
+        """Test that cancelling the leader doesn't strand coalesced waiters"""
+        async def scenario():
+            cache = AnalysisCache()
+            input_data = make_input()
+
+            async def slow_compute():
+                await asyncio.sleep(10)
+                return make_response()
+
+            leader = asyncio.create_task(cache.run_coalesced(input_data, slow_compute))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(cache.run_coalesced(input_data, slow_compute))
+            await asyncio.sleep(0)
+
+            leader.cancel()
+            # The waiter must fail fast rather than hang on the dead flight
+            with pytest.raises(asyncio.CancelledError):
+                await asyncio.wait_for(waiter, timeout=1.0)
+            assert len(cache._inflight) == 0
+
+            # A fresh request becomes a new leader and succeeds
+            async def ok_compute():
+                return make_response()
+
+            result = await cache.run_coalesced(input_data, ok_compute)
+            assert result.user_id == "user-123"
+
+        asyncio.run(scenario())
+
+
+def fake_encoder(text: str) -> np.ndarray:
+    """
+    Deterministic stand-in for the sentence encoder: maps known phrases to
+    fixed directions so similarity is controllable in tests
+    """
+    vec = np.zeros(4, dtype=np.float32)
+    if "hiking" in text:
+        vec[0] = 1.0
+        if "love" in text:
+            vec[1] = 0.2  # slightly off-axis but still > 0.9 cosine
+    else:
+        vec[2] = 1.0
+    return vec / np.linalg.norm(vec)
+
+
+class TestSemanticCache:
+    """Tests for the semantic nearest-neighbor cache"""
+
+    def test_empty_cache_misses(self):
+        """Test that an empty cache always misses"""
+        async def scenario():
+            cache = SemanticCache(encoder=fake_encoder)
+            assert await cache.get(make_input()) is None
+            assert cache.misses == 1
+
+        asyncio.run(scenario())
+
+    def test_similar_answer_hits(self):
+        """Test that a semantically similar answer returns the cached response"""
+        async def scenario():
+            cache = SemanticCache(encoder=fake_encoder)
+            await cache.set(make_input(answer="I enjoy hiking on weekends."), make_response())
+
+            hit = await cache.get(make_input(answer="I love hiking every weekend."))
+            assert hit is not None
+            assert cache.hits == 1
+
+        asyncio.run(scenario())
+
+    def test_dissimilar_answer_misses(self):
+        """Test that an unrelated answer does not hit"""
+        async def scenario():
+            cache = SemanticCache(encoder=fake_encoder)
+            await cache.set(make_input(answer="I enjoy hiking on weekends."), make_response())
+
+            assert await cache.get(make_input(answer="I mostly stay home and read.")) is None
+
+        asyncio.run(scenario())
+
+    def test_lfu_eviction(self):
+        """Test that the least frequently used entry is evicted when full"""
+        async def scenario():
+            cache = SemanticCache(max_size=1, encoder=fake_encoder)
+            await cache.set(make_input(answer="I enjoy hiking on weekends."), make_response())
+            await cache.set(make_input(answer="I mostly stay home and read."), make_response())
+
+            assert len(cache._responses) == 1
+            assert await cache.get(make_input(answer="I love hiking every weekend.")) is None
+
+        asyncio.run(scenario())
+
+    def test_disabled_without_encoder(self):
+        """Test that the cache degrades to a no-op when no encoder loads"""
+        async def scenario():
+            cache = SemanticCache(encoder=fake_encoder)
+            cache._encoder_failed = True
+            await cache.set(make_input(), make_response())
+            assert await cache.get(make_input()) is None
+
+        asyncio.run(scenario())
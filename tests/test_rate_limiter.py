@@ -0,0 +1,169 @@
+"""
+Unit tests for the token-bucket rate limiter
+"""
+import asyncio
+
+import pytest
+from src.rate_limiter import RateLimiter, parse_trusted_proxies, resolve_client_ip
+
+
+class TestRateLimiter:
+    """Tests for RateLimiter"""
+
+    def test_allows_under_limit(self):
+        """Test that requests under the limit are allowed"""
+        async def scenario():
+            limiter = RateLimiter(requests_per_minute=5, requests_per_hour=100)
+            for _ in range(5):
+                allowed, reason, _, _ = await limiter.check_rate_limit("1.2.3.4")
+                assert allowed
+                assert reason == ""
+
+        asyncio.run(scenario())
+
+    def test_denies_over_minute_limit(self):
+        """Test that the request after the minute budget is denied"""
+        async def scenario():
+            limiter = RateLimiter(requests_per_minute=3, requests_per_hour=100)
+            for _ in range(3):
+                assert (await limiter.check_rate_limit("1.2.3.4"))[0]
+
+            allowed, reason, _, _ = await limiter.check_rate_limit("1.2.3.4")
+            assert not allowed
+            assert "per minute" in reason
+
+        asyncio.run(scenario())
+
+    def test_denies_over_hour_limit(self):
+        """Test that the hour budget is enforced independently"""
+        async def scenario():
+            limiter = RateLimiter(requests_per_minute=100, requests_per_hour=2)
+            assert (await limiter.check_rate_limit("1.2.3.4"))[0]
+            assert (await limiter.check_rate_limit("1.2.3.4"))[0]
+
+            allowed, reason, _, _ = await limiter.check_rate_limit("1.2.3.4")
+            assert not allowed
+            assert "per hour" in reason
+
+        asyncio.run(scenario())
+
+    def test_ips_have_independent_buckets(self):
+        """Test that one IP exhausting its budget doesn't affect another"""
+        async def scenario():
+            limiter = RateLimiter(requests_per_minute=1, requests_per_hour=100)
+            assert (await limiter.check_rate_limit("1.2.3.4"))[0]
+            assert not (await limiter.check_rate_limit("1.2.3.4"))[0]
+            assert (await limiter.check_rate_limit("5.6.7.8"))[0]
+
+        asyncio.run(scenario())
+
+    def test_tokens_refill_over_time(self):
+        """Test that an empty bucket refills as time passes"""
+        async def scenario():
+            limiter = RateLimiter(requests_per_minute=60, requests_per_hour=10000)
+            ip = "1.2.3.4"
+            for _ in range(60):
+                assert (await limiter.check_rate_limit(ip))[0]
+            assert not (await limiter.check_rate_limit(ip))[0]
+
+            # Rewind the last refill by two seconds: at 1 token/s that's
+            # enough budget for two more requests
+            tokens, last_refill = limiter.minute_buckets[ip]
+            limiter.minute_buckets[ip] = (tokens, last_refill - 2.0)
+
+            assert (await limiter.check_rate_limit(ip))[0]
+            assert (await limiter.check_rate_limit(ip))[0]
+            assert not (await limiter.check_rate_limit(ip))[0]
+
+        asyncio.run(scenario())
+
+    def test_concurrent_checks_consume_exactly_one_token_each(self):
+        """Test that concurrent checks on one IP don't lose updates"""
+        async def scenario():
+            limiter = RateLimiter(requests_per_minute=10, requests_per_hour=100)
+            results = await asyncio.gather(
+                *(limiter.check_rate_limit("1.2.3.4") for _ in range(15))
+            )
+            allowed = sum(1 for result in results if result[0])
+            assert allowed == 10
+
+        asyncio.run(scenario())
+
+    def test_ip_count_is_bounded(self):
+        """Test that the oldest IP is evicted once the cap is reached"""
+        async def scenario():
+            limiter = RateLimiter(
+                requests_per_minute=10, requests_per_hour=100, max_ips=2
+            )
+            await limiter.check_rate_limit("1.1.1.1")
+            await limiter.check_rate_limit("2.2.2.2")
+            await limiter.check_rate_limit("3.3.3.3")
+
+            assert len(limiter.minute_buckets) == 2
+            assert "1.1.1.1" not in limiter.minute_buckets
+            assert "3.3.3.3" in limiter.minute_buckets
+
+        asyncio.run(scenario())
+
+    def test_stale_ips_are_pruned(self):
+        """Test that IPs idle past the stale window are swept"""
+        async def scenario():
+            limiter = RateLimiter(requests_per_minute=10, requests_per_hour=100)
+            await limiter.check_rate_limit("1.2.3.4")
+
+            # Age the entry past the stale window and force the next check
+            # to run a prune pass
+            for buckets in (limiter.minute_buckets, limiter.hour_buckets):
+                tokens, last_refill = buckets["1.2.3.4"]
+                buckets["1.2.3.4"] = (tokens, last_refill - 4000.0)
+            limiter._last_prune -= 4000.0
+
+            await limiter.check_rate_limit("5.6.7.8")
+            assert "1.2.3.4" not in limiter.minute_buckets
+            assert "1.2.3.4" not in limiter.hour_buckets
+
+        asyncio.run(scenario())
+
+    def test_check_reports_remaining(self):
+        """Test that the check result reflects consumed tokens"""
+        async def scenario():
+            limiter = RateLimiter(requests_per_minute=10, requests_per_hour=100)
+            await limiter.check_rate_limit("1.2.3.4")
+            _, _, remaining_minute, remaining_hour = \
+                await limiter.check_rate_limit("1.2.3.4")
+            assert remaining_minute == 8
+            assert remaining_hour == 98
+
+        asyncio.run(scenario())
+
+
+class TestResolveClientIp:
+    """Tests for X-Forwarded-For handling"""
+
+    def test_header_ignored_without_trusted_proxies(self):
+        """Test that X-Forwarded-For is ignored when no proxies are trusted"""
+        trusted = parse_trusted_proxies("")
+        assert resolve_client_ip("9.9.9.9", "1.2.3.4", trusted) == "9.9.9.9"
+
+    def test_header_used_behind_trusted_proxy(self):
+        """Test that the leftmost forwarded IP wins when the peer is trusted"""
+        trusted = parse_trusted_proxies("10.0.0.0/8")
+        assert (
+            resolve_client_ip("10.1.2.3", "1.2.3.4, 10.1.2.3", trusted)
+            == "1.2.3.4"
+        )
+
+    def test_header_ignored_from_untrusted_peer(self):
+        """Test that an untrusted peer can't spoof its IP via the header"""
+        trusted = parse_trusted_proxies("10.0.0.0/8")
+        assert resolve_client_ip("9.9.9.9", "1.2.3.4", trusted) == "9.9.9.9"
+
+    def test_wildcard_trusts_any_peer(self):
+        """Test that '*' trusts the header from every peer"""
+        trusted = parse_trusted_proxies("*")
+        assert resolve_client_ip("9.9.9.9", "1.2.3.4", trusted) == "1.2.3.4"
+
+    def test_malformed_header_falls_back_to_peer(self):
+        """Test that a garbage header doesn't become a bucket key"""
+        trusted = parse_trusted_proxies("*")
+        assert resolve_client_ip("9.9.9.9", "not-an-ip", trusted) == "9.9.9.9"